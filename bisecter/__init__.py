@@ -15,277 +15,46 @@
 """Tool to drive bisection over multiple set of arguments"""
 
 import argparse
-import dataclasses
-import enum
-import math
+import contextlib
+import importlib
+import io
+import json
 import os
-import pickle
-import pipes
 import re
-import subprocess
+import shlex
+import signal
 import sys
+import traceback
 
 from bisecter import utils
+from bisecter.bisection import (_PROGRESS_MAGIC, _format_identifier,
+                                Bisection, BisectionLogEntry,
+                                BisectionStatus, Bisections)
 
 
-class BisectionStatus(enum.Enum):
-    """Bisection status"""
-    GOOD = 0
-    BAD = 1
-    SKIP = 125
+#: range(start[, stop[, step]]) used in --extended-arguments
+_RE_RANGE = re.compile(r'(range\((\d+)(,\s*\d+\s*)?(,\s*\d+\s*)?\))')
 
 
-@dataclasses.dataclass
-class BisectionLogEntry:
-    """Log entry"""
-    status: BisectionStatus
-    identifier: list
-
-    def __str__(self):
-        return (f"{self.status.name:4s} "
-                f"{'-'.join(str(_) for _ in self.identifier)}")
-
-    def __repr__(self):
-        return (f"{self.status.name:4s} "
-                f"{'-'.join(str(_) for _ in self.identifier)}")
-
-    def __eq__(self, other):
-        if isinstance(other, BisectionLogEntry):
-            return self.identifier == other.identifier
-        if isinstance(other, str):
-            return '-'.join(str(_) for _ in self.identifier) == other
-        return self.identifier == other
-
-
-class Bisection:
+def _json_float(literal):
     """
-    Object to keep track of a single bisection
+    Parse JSON float the same way YAML would (exponents need YAML parsing)
     """
-    current = None
-    _good = None
-    _bad = None
-
-    def __init__(self, values):
-        self.values = values
-        self.current = self._first_bad = self.last_index = len(values) - 1
-        self._good = 0
-        self._bad = self.last_index
-        self._skips = []
-        # TODO: Investigate improvements for skip columns cases
-        # self.no_good = True
-
-    def value(self, index=None):
-        """Value associated to the ``index`` value (by default current one)"""
-        if index is not None:
-            return self.values[index]
-        return self.values[self.current]
-
-    def update_current(self):
-        """Update current according to good and bad"""
-        self.current = (self._good + self._bad) // 2
-
-    def good(self):
-        """Mark the current step as good (go to right)"""
-        new = self.current + 1
-        # We iterate over multiple arrays and can not be sure the last
-        # one of each is bad
-        if (self._bad <= new and
-                new != self.last_index):
-            self.reset(self._first_bad, self._first_bad)
-            return None
-        self._good = new
-        self.update_current()
-        return self.current
-
-    def bad(self):
-        """Mark the current step as bad (go to left)"""
-        self._first_bad = self.current
-        if self.current <= self._good:
-            self.reset(self._first_bad, self._first_bad)
-            return None
-        self._bad = self.current
-        self.update_current()
-        if self.current <= 0:
-            self.reset(self._first_bad, self._first_bad)
-            return None
-        return self.current
-
-    def skip(self):
-        """Mark the current step as skip (untestable)"""
-        self._skips.append(self.current)
-        new = (self._good + self._bad) // 2
-        max_offset = new * 2
-        offset = 0
-        while new in self._skips:
-            if offset < 0:
-                offset = 1 - offset
-            else:
-                offset = -1 - offset
-            if abs(offset) > max_offset:
-                self.reset(self._first_bad, self._first_bad)
-                return None
-            new += offset
-            if new <= self._good or new >= self._bad:
-                # We don't want to test good and bad, but we still want to
-                # test the remaining items up to the max offset
-                self._skips.append(new)
-        self.current = new
-        return self.current
-
-    def steps_left(self):
-        """Report the approximate number of remaining steps"""
-        variants = self.variants_left()
-        if variants > 1:
-            return math.ceil((math.log2(variants + 1)))
-        return 0
-
-    def variants_left(self):
-        """Report the number of variants"""
-        if self._bad is None:
-            return len(self.values)
-        return self._bad - self._good - len(self._skips)
-
-    def reset(self, good=None, bad=None):
-        """Reset the bisection, optionally select good/bad positions"""
-        self._good = 0 if good is None else good
-        self._bad = self.last_index if bad is None else bad
-        self._skips = []
-        self.update_current()
+    if 'e' in literal or 'E' in literal:
+        raise ValueError(f"Float {literal} has to be parsed by YAML")
+    return float(literal)
 
 
-class Bisections:
+def _json_constant(literal):
     """
-    Keeps track of a bisection over multiple arrays
+    NaN/Infinity are not part of JSON standard, YAML treats them as strings
     """
+    raise ValueError(f"Constant {literal} has to be parsed by YAML")
 
-    def __init__(self, args):
-        self.args = [Bisection(arg) for arg in args]
-        # Initialize log with first and last checks (trust the user)
-        self._log = [BisectionLogEntry(BisectionStatus.GOOD,
-                                       [0 for _ in args]),
-                     BisectionLogEntry(BisectionStatus.BAD,
-                                       [len(_) - 1 for _ in args])]
-        self._active = -1
-        self._postprocess_current(None)
-
-    def current(self):
-        """Reports the current variant indexes"""
-        return [arg.current for arg in self.args]
-
-    def value(self, variant=None):
-        """Reports parameters of the current variant"""
-        if variant is None:
-            variant = self.current()
-        return [self.args[i].value(index)
-                for i, index in enumerate(variant)]
-
-    def good(self):
-        """Mark the current step as good (go to right)"""
-        current = self.current()
-        self._log.append(BisectionLogEntry(BisectionStatus.GOOD, current))
-        if self._active >= len(self.args):
-            return self._postprocess_current(None)
-        #self.args[self._active].no_good = False
-        if self.args[self._active].current == 0:
-            # It won't reproduce with the first argument, which means we have
-            # to investigate this item. Reset it and start bisection
-            self.args[self._active].reset()
-            return self._postprocess_current(0)
-        this = self.args[self._active].good()
-        return self._postprocess_current(this)
-
-    def bad(self):
-        """Mark the current step as bad (go to left)"""
-        self._log.append(BisectionLogEntry(BisectionStatus.BAD,
-                                           self.current()))
-        if self._active >= len(self.args):
-            return self._postprocess_current(None)
-        if self.args[self._active].current == 0:
-            # Still failing with the first argument, this axis is irrelevant,
-            # skip it
-            self.args[self._active].reset(0, 0)
-            return self._postprocess_current(None)
-        this = self.args[self._active].bad()
-        return self._postprocess_current(this)
-
-    def skip(self):
-        """Mark the current step as skip (untestable)"""
-        self._log.append(BisectionLogEntry(BisectionStatus.SKIP,
-                                           self.current()))
-        if self._active >= len(self.args):
-            return self._postprocess_current(None)
-        this = self.args[self._active].skip()
-        return self._postprocess_current(this)
-
-    def _postprocess_current(self, this):
-        """
-        Perform common checks on the next variant
-
-        Based on the values it can skip to the next axis, report the previously
-        logged status or simply return the next "current" variant
-
-        :param this: Value of the next index of the current active axis (7)
-        :return: next "current" variant (0-0-7)
-        """
-        if this is None:  # or this == 0:
-            self._active += 1
-            if self._active >= len(self.args):
-                # TODO: Investigate improvements for skip columns cases
-                """
-                # In case of many skips certain columns might have not been
-                # tested yet
-                for i, arg in enumerate(self.args):
-                    '''
-                    if arg._good == arg.last_index:
-                        variant = [_.current if i == j else 0
-                                   for j, _ in enumerate(self.args)]
-                        if variant not in self._log:
-                            arg.reset()
-                            arg.current = 0
-                            return self.current()
-                    '''
-                    if getattr(arg, 'no_good', False) is True:
-                        # I need to go up on these
-                        #import pydevd; pydevd.settrace("127.0.0.1", True, True)
-                        #for _ in self.args:
-                        #    if _.no_good is True:
-                        #        _.reset()
-                        #        _.curret = _.last_index
-                        arg.current = 0
-                        # Set this one to False to skip it next time
-                        arg.no_good = False
-                        self._active = i
-                        return self.current()
-                """
-                return None
-            # Initialize the next axis to 0 to try if it is important
-            self.args[self._active].current = 0
-            return self._postprocess_current(0)
-        current = self.current()
-        if current in self._log:
-            status = [_.status for _ in self._log if _ == current][0]
-            action = {BisectionStatus.GOOD: "good",
-                      BisectionStatus.BAD: "bad",
-                      BisectionStatus.SKIP: "skip"}[status]
-            return self._postprocess_current(getattr(self.args[self._active],
-                                              action)())
-        return current
-
-    def steps_left(self):
-        """Report how many steps to test"""
-        return (sum(_.steps_left() for _ in self.args) +
-                len(self.args) - self._active)
-
-    def variants_left(self):
-        """Report how many variants to test"""
-        variants = [_.variants_left() or 1 for _ in self.args[self._active:]]
-        if not variants:
-            return 0
-        return math.prod(variants)
 
-    def log(self):
-        """Report bisection log"""
-        return('\n'.join(str(entry) for entry in self._log))
+class BisecterError(Exception):
+
+    """Error with a user-facing message reported by :class:`Bisecter`"""
 
 
 class Bisecter:
@@ -308,7 +77,8 @@ class Bisecter:
                 'args': self.arguments,
                 'id': self.identifier,
                 'log': self.log,
-                'reset': self.reset}.get(self.args.cmd)
+                'reset': self.reset,
+                'serve': self.serve}.get(self.args.cmd)
         if func is None:
             sys.stderr.write(f"Unknown command {self.args.cmd}\n")
             sys.exit(-1)
@@ -319,6 +89,13 @@ class Bisecter:
         Define arguments
         """
 
+        def fraction(arg):
+            """Parse fraction (0, 1)"""
+            value = float(arg)
+            if not 0 < value < 1:
+                raise ValueError(f"{arg} not in (0, 1) range")
+            return value
+
         def variant_id(arg):
             """Parse variant ID"""
             if arg in ('good', 'bad'):
@@ -334,11 +111,22 @@ class Bisecter:
                             type=os.path.abspath)
         subparsers = parser.add_subparsers(dest='cmd')
         start = subparsers.add_parser('start', help='Initialize bisection')
-        start.add_argument('--from-yaml', help='Read arguments from YAML file')
+        start.add_argument('--from-yaml', help='Read arguments from YAML '
+                           '(or JSON) file')
         start.add_argument('--extended-arguments', '-E', help='On top of the '
                            'comma separated arguments allow certain evals, '
                            'eg. foo,range(10,31,10),bar becomes ["foo", "10", '
                            '"20", "30", "bar"]', action='store_true')
+        start.add_argument('--bias', help='For numeric axes probe closer to '
+                           'the first (good) value in the first bisection '
+                           'step (geometric instead of arithmetic mean), '
+                           'useful when the breakage is expected to be '
+                           'close to the good end', action='store_true')
+        start.add_argument('--start-fraction', help='Position of the first '
+                           'probe of each axis as a fraction of its range, '
+                           'eg. 0.33 to start closer to the first (good) '
+                           'value; subsequent steps use the midpoint '
+                           '(%(default)s)', type=fraction, default=0.5)
         start.add_argument('--dry-run', help='Do not actually start bisection,'
                            'only parse the arguments and report the axis',
                            action='store_true')
@@ -364,6 +152,14 @@ class Bisecter:
                          "values using the \\d number as index (allowing "
                          "negative values). Use double brackets to skip "
                          "the replacement.")
+        run.add_argument("--runner-module", metavar="MODULE:FUNC",
+                         help="Instead of executing the command call "
+                         "FUNC(args) from the importable MODULE (eg. "
+                         "'mytests:check'). The args is a list of strings "
+                         "(the optional command with the bisection values "
+                         "appended or templated) and FUNC has to return an "
+                         "int which is interpreted the same way as the "
+                         "command's exit code.")
         run.add_argument('command', help='Command to be executed',
                          nargs=argparse.REMAINDER)
         args = subparsers.add_parser('args', help='Report the variant '
@@ -385,28 +181,72 @@ class Bisecter:
         _ = subparsers.add_parser('log', help='Report the bisection log')
         _ = subparsers.add_parser('reset', help='Cleanup the bisection '
                                   'by removing all associated files.')
+        _ = subparsers.add_parser('serve', help='Keep reading bisecter '
+                                  'commands (eg. "bad" or "args -r") from '
+                                  'stdin, one per line, and report each '
+                                  'result as a line of JSON with '
+                                  '"returncode", "stdout" and "stderr" '
+                                  'keys. Useful to drive many steps without '
+                                  'starting bisecter for each of them.')
         return parser.parse_args(command_line)
 
+    @property
+    def _args_file(self):
+        """Path to the file holding the (static) bisection values"""
+        return self.args.state_file + '.args'
+
+    def _save_args(self):
+        """
+        Records the static bisection values; done only once on start
+        """
+        try:
+            with open(self._args_file, 'w', encoding='utf8') as fd_args:
+                json.dump({"values": [arg.values
+                                      for arg in self.bisection.args],
+                           "options": self.bisection.options}, fd_args,
+                          separators=(',', ':'))
+        except IOError as details:
+            sys.stderr.write("Failed to open bisecter state file "
+                             f"{self._args_file}: {details}\n")
+            sys.exit(-1)
+
     def _save_state(self):
         """
-        Records the self.bisection in a state file
+        Records the self.bisection progress in a state file (when changed)
         """
+        if not self.bisection.dirty:
+            return
+        tmp_path = self.args.state_file + '.tmp'
         try:
-            with open(self.args.state_file, 'bw') as fd_state:
-                pickle.dump(self.bisection, fd_state)
+            with open(tmp_path, 'bw') as fd_state:
+                fd_state.write(self.bisection.dump_progress())
+            os.replace(tmp_path, self.args.state_file)
         except IOError as details:
             sys.stderr.write("Failed to open bisecter state file "
                              f"{self.args.state_file}: {details}\n")
             sys.exit(-1)
+        self.bisection.dirty = False
 
     def _load_state(self):
         """
-        Reads the state file and updates self.bisection
+        Reads the state files and updates self.bisection
         """
         try:
             with open(self.args.state_file, 'br') as fd_state:
-                self.bisection = pickle.load(fd_state)
-        except pickle.UnpicklingError as details:
+                progress = fd_state.read()
+            if progress.startswith(b'\x80'):
+                # Pickle protocol 2+ header used by older bisecter versions
+                raise ValueError("State file was created by an older "
+                                 "bisecter version, please run "
+                                 f"'{sys.argv[0]} start' again")
+            if not progress.startswith(_PROGRESS_MAGIC):
+                raise ValueError("Not a bisecter progress file")
+            with open(self._args_file, encoding='utf8') as fd_args:
+                static = json.load(fd_args)
+            self.bisection = Bisections.load_progress(static["values"],
+                                                      progress,
+                                                      **static["options"])
+        except (KeyError, TypeError, ValueError) as details:
             sys.stderr.write("Failed to read bisecter state from "
                              f"{self.args.state_file}: {details}\n")
             sys.exit(-1)
@@ -418,25 +258,34 @@ class Bisecter:
 
     def _parse_extended_args(self, arguments):
 
-        def range_repl(matchobj):
+        def match_range(matchobj):
             args = []
             args.append(int(matchobj.group(2)))
             for arg in matchobj.groups()[2:]:
                 if arg is None:
                     continue
                 args.append(int(arg[1:]))
-            return ','.join(str(_) for _ in range(*args))
+            return range(*args)
+
+        def range_repl(matchobj):
+            return ','.join(map(str, match_range(matchobj)))
 
-        re_range = re.compile(r'(range\((\d+)(,\s*\d+\s*)?(,\s*\d+\s*)?\))')
         args = []
+        # Pages fetched by url:// arguments (usually the same page is used)
+        url_cache = {}
         for arg in arguments:
-            if arg.startswith("beaker://"):
+            if arg.startswith(utils.BEAKER_PREFIX):
                 parsed_args = utils.range_beaker(arg)
-            elif arg.startswith("url://"):
-                parsed_args = utils.range_url(arg)
+            elif arg.startswith(utils.URL_PREFIX):
+                parsed_args = utils.range_url(arg, cache=url_cache)
             else:
-                line = re_range.sub(range_repl, arg)
-                parsed_args = self._split_by_comma(line)
+                matchobj = _RE_RANGE.fullmatch(arg)
+                if matchobj:
+                    # Plain range, no need to join and split it again
+                    parsed_args = list(map(str, match_range(matchobj)))
+                else:
+                    line = _RE_RANGE.sub(range_repl, arg)
+                    parsed_args = self._split_by_comma(line)
             if not parsed_args:
                 raise ValueError(f"Extended argument {arg} resulted in empty "
                                  "list.")
@@ -445,7 +294,55 @@ class Bisecter:
 
     @staticmethod
     def _split_by_comma(arg):
-        return [val.replace('\\,', ',') for val in re.split(r'(?<!\\),', arg)]
+        if '\\,' not in arg:
+            return arg.split(',')
+        # Mask escaped commas by NUL (can not be part of a cmdline argument)
+        return [val.replace('\0', ',')
+                for val in arg.replace('\\,', '\0').split(',')]
+
+    @staticmethod
+    def load_yaml(path):
+        """
+        Load arguments from YAML (or JSON) file
+
+        JSON lists are parsed directly, except for values where JSON and
+        YAML (SafeLoader) differ (eg. ``1e3`` or ``NaN`` are strings in
+        YAML), those are left to YAML to get the same values.
+
+        :param path: path to the file containing list of lists
+        :return: list of lists of string arguments
+        :raise BisecterError: when the file can not be loaded
+        """
+        try:
+            with open(path, encoding='utf8') as inp:
+                content = inp.read()
+        except IOError as details:
+            raise BisecterError(f'Failed to read arguments file {path}: '
+                                f'{details}') from details
+        try:
+            # JSON is (mostly) a subset of YAML and much faster to parse
+            if not content.lstrip().startswith(('[', '{')):
+                raise ValueError("Not a JSON list/object")
+            arguments = json.loads(content, parse_float=_json_float,
+                                   parse_constant=_json_constant)
+        except ValueError:
+            try:
+                import yaml  # optional dependency pylint: disable=C0415
+            except ImportError as details:
+                raise BisecterError("PyYAML not installed, unable to load "
+                                    "arguments from file") from details
+            try:
+                arguments = yaml.load(content, yaml.SafeLoader)
+            except yaml.YAMLError as details:
+                raise BisecterError(f'Failed to load arguments from {path}: '
+                                    f'{details}') from details
+        try:
+            return [[str(arg) for arg in args] for args in arguments]
+        except Exception as details:
+            raise BisecterError(f'Failed to parse arguments from {path}, '
+                                'ensure it contains list of lists '
+                                f'convertable to strings: {details}') \
+                from details
 
     def start(self):
         """
@@ -457,39 +354,23 @@ class Bisecter:
                                  'as positional arguments with the ones '
                                  f'from "{self.args.from_yaml}" file\n')
             try:
-                import yaml  # optional dependency pylint: disable=C0415
-            except ImportError:
-                sys.stderr.write("PyYAML not installed, unable to load "
-                                 "arguments from file\n")
+                arguments = self.load_yaml(self.args.from_yaml)
+            except BisecterError as details:
+                sys.stderr.write(f"{details}\n")
                 sys.exit(-1)
+        elif self.args.extended_arguments:
             try:
-                with open(self.args.from_yaml, encoding='utf8') as inp:
-                    arguments = yaml.load(inp, yaml.SafeLoader)
-                    try:
-                        arguments = [[str(arg) for arg in args]
-                                     for args in arguments]
-                    except Exception as details:
-                        sys.stderr.write('Failed to parse arguments from '
-                                         f'{self.args.from_yaml}, ensure '
-                                         'it contains list of lists '
-                                         'convertable to strings: '
-                                         f'{details}\n')
-                        sys.exit(-1)
-            except yaml.YAMLError as details:
-                sys.stderr.write('Failed to load arguments from '
-                                 f'{self.args.from_yaml}: {details}\n')
-                sys.exit(-1)
-            except IOError as details:
-                sys.stderr.write('Failed to read arguments file '
-                                 f'{self.args.from_yaml}: {details}\n')
+                arguments = self._parse_extended_args(self.args.arguments)
+            except ValueError as details:
+                sys.stderr.write(f"Failed to parse extended arguments: "
+                                 f"{details}\n")
                 sys.exit(-1)
-        elif self.args.extended_arguments:
-            arguments = self._parse_extended_args(self.args.arguments)
         else:
             arguments = []
             for arg in self.args.arguments:
                 arguments.append(self._split_by_comma(arg))
-        self.bisection = Bisections(arguments)
+        self.bisection = Bisections(arguments, bias=self.args.bias,
+                                    start_fraction=self.args.start_fraction)
         if os.path.exists(self.args.state_file):
             sys.stderr.write(f"Bisection in '{self.args.state_file}' already "
                              "in progress\n")
@@ -499,6 +380,7 @@ class Bisecter:
         if self.args.dry_run:
             print("Bisection not started, running in --dry-run mode")
             return
+        self._save_args()
         self._save_state()
         print(self._current_value())
 
@@ -506,30 +388,43 @@ class Bisecter:
         """
         Report value of the current variant in a simple form
         """
-        return ' '.join(pipes.quote(_) for _ in self.bisection.value(variant))
+        if variant is None:
+            values = self.bisection.current_value()
+        else:
+            values = self.bisection.value(variant)
+        return ' '.join(shlex.quote(_) for _ in values)
+
+    def _remaining_steps(self):
+        """
+        Format remaining steps count
+        """
+        return (f"Bisecter: {self.bisection.variants_left()} variants left to "
+                f"test after this (roughly {self.bisection.steps_left()} "
+                "steps)\n")
 
     def _report_remaining_steps(self):
         """
         Report remaining steps count
         """
-        sys.stderr.write(f"Bisecter: {self.bisection.variants_left()} variants"
-                         " left to test after this (roughly "
-                         f"{self.bisection.steps_left()} steps)\n")
+        sys.stderr.write(self._remaining_steps())
 
     def _report_detailed_stats(self):
         """
         Report details about axis
         """
-        for i, axis in enumerate(self.bisection.args):
-            sys.stderr.write(f"{i} ({len(axis.values)}): "
-                             f"{','.join(str(_) for _ in axis.values)}\n")
+        sys.stderr.write(''.join(f"{i} ({len(axis.values)}): "
+                                 f"{','.join(map(str, axis.values))}\n"
+                                 for i, axis
+                                 in enumerate(self.bisection.args)))
 
     def status(self):
         """
         Set the result of the current bisection combination
         """
         self._load_state()
-        ret = getattr(self.bisection, self.args.cmd)()
+        ret = {'good': self.bisection.good,
+               'bad': self.bisection.bad,
+               'skip': self.bisection.skip}[self.args.cmd]()
         self._save_state()
         if ret is None:
             self._print_complete_status()
@@ -539,15 +434,11 @@ class Bisecter:
     def _print_complete_status(self):
         current = self.bisection.current()
         prefix = f"Bisection complete in {len(self.bisection._log)} steps, "
-        if any(current):
-            axes = [str(i) for i, v in enumerate(current) if v != 0]
+        axes = [str(i) for i, v in enumerate(current) if v != 0]
+        if axes:
             if len(axes) == len(self.bisection.args):
-                last = True
-                for arg in self.bisection.args:
-                    if arg.current != arg.last_index:
-                        last = False
-                        break
-                if last:
+                if all(index == arg.last_index for index, arg
+                       in zip(current, self.bisection.args)):
                     print(f"{prefix}only the last combination "
                           "is failing (is the last one really failing?):")
                 else:
@@ -570,43 +461,84 @@ class Bisecter:
                   "combination reports failure:")
         print(self._current_value())
 
+    @staticmethod
+    def _load_runner(spec):
+        """
+        Import the "module:function" runner used by the "run" command
+        """
+        module_name, _, func_name = spec.partition(':')
+        try:
+            module = importlib.import_module(module_name)
+            return getattr(module, func_name)
+        except Exception as details:  # pylint: disable=W0703
+            # Any exception (including SyntaxError) raised by the module
+            sys.stderr.write(f"Failed to load runner {spec}: {details}\n")
+            sys.exit(-1)
+
     def run(self):
         """
         Keep executing args.command using it's exit code to drive the bisection
         """
-        def get_cmd():
-            if self.args.template:
+        def get_cmd(values):
+            if template:
                 try:
-                    return utils.simple_template(self.args.command,
-                                                 self.bisection.value())
+                    return template(values)
                 except utils.ReplaceIndexError as exc:
                     sys.stderr.write(f"{exc}\n")
                     sys.exit(-1)
-            return self.args.command + self.bisection.value()
+            return self.args.command + values
+
+        if self.args.template:
+            template = utils.compile_template(self.args.command)
+        else:
+            template = None
+        if self.args.runner_module:
+            runner = self._load_runner(self.args.runner_module)
+        else:
+            runner = utils.run_command
 
         self._load_state()
-        bret = True
-        while bret is not None:
-            self._report_remaining_steps()
-            args = get_cmd()
-            sys.stderr.write(f"Bisecter: Running: {args}\n")
-            ret = subprocess.run(args, check=False)
-            if ret.returncode == 0:
-                sys.stderr.write(f"Bisecter: GOOD {self._current_value()}\n")
-                bret = self.bisection.good()
-            elif ret.returncode == 125:
-                sys.stderr.write(f"Bisecter: SKIP {self._current_value()}\n")
-                bret = self.bisection.skip()
-            elif ret.returncode <= 127:
-                sys.stderr.write(f"Bisecter: BAD {self._current_value()}\n")
-                bret = self.bisection.bad()
-            else:
-                self._save_state()
-                sys.stderr.write(f"Command {' '.join(self.args.command)}"
-                                 f"returned {ret.returncode}, interrupting"
-                                 " the automated bisection.\n")
-                sys.exit(-1)
+        # Only record the state at the end or when interrupted
+        sigterm_handler = signal.signal(
+            signal.SIGTERM, lambda signum, _: sys.exit(128 + signum))
+        try:
+            bret = True
+            while bret is not None:
+                values = self.bisection.current_value()
+                args = get_cmd(values)
+                variant = ' '.join(shlex.quote(_) for _ in values)
+                sys.stderr.write(f"{self._remaining_steps()}"
+                                 f"Bisecter: Running: {shlex.join(args)}\n")
+                returncode = runner(args)
+                if not isinstance(returncode, int):
+                    sys.stderr.write(f"Runner {self.args.runner_module} "
+                                     f"returned {returncode!r} instead of "
+                                     "int exit code, interrupting the "
+                                     "automated bisection.\n")
+                    sys.exit(-1)
+                if returncode == 0:
+                    sys.stderr.write(f"Bisecter: GOOD {variant}\n")
+                    bret = self.bisection.good()
+                elif returncode == 125:
+                    sys.stderr.write(f"Bisecter: SKIP {variant}\n")
+                    bret = self.bisection.skip()
+                elif returncode <= 127:
+                    sys.stderr.write(f"Bisecter: BAD {variant}\n")
+                    bret = self.bisection.bad()
+                else:
+                    if self.args.runner_module:
+                        what = f"Runner {self.args.runner_module}"
+                    else:
+                        what = f"Command {' '.join(self.args.command)}"
+                    sys.stderr.write(f"{what} returned {returncode}, "
+                                     "interrupting the automated "
+                                     "bisection.\n")
+                    sys.exit(-1)
+        finally:
             self._save_state()
+            # None means the previous handler was not set from Python
+            signal.signal(signal.SIGTERM, signal.SIG_DFL
+                          if sigterm_handler is None else sigterm_handler)
         self._print_complete_status()
 
     def arguments(self):
@@ -634,7 +566,7 @@ class Bisecter:
                     print(self._current_value(variant))
         except IndexError:
             sys.stderr.write("Incorrect id "
-                             f"{'-'.join(str(_) for _ in variant)}\n")
+                             f"{_format_identifier(variant)}\n")
             sys.exit(-1)
 
     def identifier(self):
@@ -642,7 +574,7 @@ class Bisecter:
         Print identifier of the current variant as shown by log
         """
         self._load_state()
-        print('-'.join(str(_) for _ in self.bisection.current()))
+        print(_format_identifier(self.bisection.current()))
 
     def log(self):
         """
@@ -662,9 +594,89 @@ class Bisecter:
             sys.stderr.write(f"No bisection in '{self.args.state_file}' "
                              "in progress\n")
         else:
-            try:
-                os.remove(self.args.state_file)
-            except IOError as details:
-                sys.stderr.write(f"Failed to remove '{self.args.state_file}': "
-                                 f"{details}\n")
-                sys.exit(-1)
+            for path in (self.args.state_file, self._args_file):
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except IOError as details:
+                    sys.stderr.write(f"Failed to remove '{path}': "
+                                     f"{details}\n")
+                    sys.exit(-1)
+
+    def serve(self):
+        """
+        Execute commands read from stdin reporting results as JSON lines
+        """
+        # Executed commands (eg. by "run") inherit stdout, point it to stderr
+        # to keep the responses parseable
+        stdout_fd = sys.stdout.fileno()
+        sys.stdout.flush()
+        orig_stdout = os.dup(stdout_fd)
+        try:
+            with os.fdopen(os.dup(stdout_fd), 'w', encoding='utf8') as out:
+                os.dup2(sys.stderr.fileno(), stdout_fd)
+                for line in sys.stdin:
+                    result = self._serve_one(line)
+                    if result is None:
+                        continue
+                    out.write(json.dumps(result) + '\n')
+                    out.flush()
+        finally:
+            sys.stdout.flush()
+            os.dup2(orig_stdout, stdout_fd)
+            os.close(orig_stdout)
+
+    def _serve_one(self, line):
+        """
+        Execute a single "serve" command line
+
+        :return: dict with returncode, stdout and stderr (None on empty line)
+        """
+        try:
+            argv = shlex.split(line)
+        except ValueError as details:
+            return {"returncode": 255, "stdout": "",
+                    "stderr": f"Failed to parse command: {details}\n"}
+        if not argv:
+            return None
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            if argv[0] == 'serve':
+                sys.stderr.write("Nested serve is not supported\n")
+                ret = 255
+            else:
+                try:
+                    ret = main(['--state-file', self.args.state_file] +
+                               argv)
+                except Exception as details:  # pylint: disable=W0703
+                    sys.stderr.write(f"Command failed: {details}\n")
+                    ret = 1
+        return {"returncode": ret, "stdout": stdout.getvalue(),
+                "stderr": stderr.getvalue()}
+
+
+def main(argv=None):
+    """
+    Execute bisecter in-process
+
+    :param argv: Command line arguments without the program name
+                 (sys.argv[1:] by default)
+    :return: Exit code as the bisecter process would report it
+    """
+    try:
+        ret = Bisecter()(argv)
+    except SystemExit as exc:
+        ret = exc.code
+    except Exception:  # pylint: disable=W0703
+        # Uncaught exceptions make the interpreter exit with 1
+        traceback.print_exc()
+        return 1
+    if ret is None:
+        return 0
+    if not isinstance(ret, int):
+        # sys.exit("message") prints the message and exits with 1
+        sys.stderr.write(f"{ret}\n")
+        return 1
+    return ret & 0xff
@@ -0,0 +1,522 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: Red Hat Inc. 2023
+# Author: Lukas Doktor <ldoktor@redhat.com>
+"""Bisection over variants of multiple sets of arguments"""
+
+import dataclasses
+import enum
+import math
+import operator
+import struct
+
+
+#: Marker identifying the bisecter progress file format
+_PROGRESS_MAGIC = b"BSC1"
+#: Progress header (magic, number of axes, active axis, number of log entries)
+_PROGRESS_HEADER = struct.Struct("<4sIiI")
+#: Per-axis progress (current, first_bad, good, bad, number of skips)
+_PROGRESS_AXIS = struct.Struct("<iiiiI")
+#: Getter of the current index of a Bisection
+_CURRENT_INDEX = operator.attrgetter('current')
+
+
+def _format_identifier(identifier):
+    """Format variant indexes as used by log and --id (eg. 0-2-1)"""
+    return '-'.join(map(str, identifier))
+
+
+def _pack_varints(numbers):
+    """Pack signed integers as zigzag-encoded varints"""
+    out = bytearray()
+    for num in numbers:
+        num = (num << 1) ^ (num >> 63)
+        while num > 0x7f:
+            out.append((num & 0x7f) | 0x80)
+            num >>= 7
+        out.append(num)
+    return out
+
+
+def _unpack_varints(data, offset, count):
+    """
+    Unpack ``count`` zigzag-encoded varints from data
+
+    :return: tuple(list of integers, offset after the last varint)
+    """
+    out = []
+    for _ in range(count):
+        num = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            num |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        out.append((num >> 1) ^ -(num & 1))
+    return out, offset
+
+
+class BisectionStatus(enum.Enum):
+    """Bisection status"""
+    GOOD = 0
+    BAD = 1
+    SKIP = 125
+
+
+class _BisectionLogEntrySlots:  # pylint: disable=R0903
+
+    """Slot of the cached identifier string of :class:`BisectionLogEntry`"""
+
+    # Defined in a base class as dataclass field with init=False would
+    # conflict with the slot of the same name
+    __slots__ = ('_idstr',)
+
+
+# Custom __eq__ (matches str/list too) can not have a consistent hash
+@dataclasses.dataclass(frozen=True, eq=False)
+class BisectionLogEntry(_BisectionLogEntrySlots):
+    """Log entry"""
+    # dataclass(slots=True) requires python 3.10
+    __slots__ = ('status', 'identifier')
+    status: BisectionStatus
+    identifier: tuple
+    _idstr: str = dataclasses.field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, '_idstr',
+                           _format_identifier(self.identifier))
+
+    def __str__(self):
+        return f"{self.status.name:4s} {self._idstr}"
+
+    def __repr__(self):
+        return str(self)
+
+    def __eq__(self, other):
+        if isinstance(other, BisectionLogEntry):
+            return self.identifier == other.identifier
+        if isinstance(other, str):
+            return self._idstr == other
+        if isinstance(other, list):
+            return self.identifier == tuple(other)
+        return self.identifier == other
+
+
+class Bisection:
+    """
+    Object to keep track of a single bisection
+    """
+    __slots__ = ('values', 'current', '_first_bad', 'last_index', '_good',
+                 '_bad', '_skips', '_bias', '_start_fraction',
+                 '_cached_variants', '_cached_steps')
+
+    def __init__(self, values, bias=False, start_fraction=0.5):
+        self.values = values
+        self.current = self._first_bad = self.last_index = len(values) - 1
+        self._good = 0
+        self._bad = self.last_index
+        self._skips = set()
+        self._bias = bias and self.is_numeric(values)
+        self._start_fraction = start_fraction
+        # Cached results of variants_left/steps_left, reset on every change
+        self._cached_variants = self._cached_steps = None
+        # TODO: Investigate improvements for skip columns cases
+        # self.no_good = True
+
+    @staticmethod
+    def is_numeric(values):
+        """Whether all values are non-negative integers"""
+        return all(str(_).isdigit() for _ in values)
+
+    def value(self, index=None):
+        """Value associated to the ``index`` value (by default current one)"""
+        if index is not None:
+            return self.values[index]
+        return self.values[self.current]
+
+    def update_current(self):
+        """Update current according to good and bad"""
+        self.current = (self._good + self._bad) >> 1
+
+    def good(self):
+        """Mark the current step as good (go to right)"""
+        new = self.current + 1
+        # We iterate over multiple arrays and can not be sure the last
+        # one of each is bad
+        if (self._bad <= new and
+                new != self.last_index):
+            self.reset(self._first_bad, self._first_bad)
+            return None
+        self._good = new
+        self.update_current()
+        self._invalidate()
+        return self.current
+
+    def bad(self):
+        """Mark the current step as bad (go to left)"""
+        bad = self._first_bad = self.current
+        if bad <= self._good:
+            self.reset(bad, bad)
+            return None
+        self._bad = bad
+        self.update_current()
+        self._invalidate()
+        if self.current <= 0:
+            self.reset(bad, bad)
+            return None
+        return self.current
+
+    def skip(self):
+        """Mark the current step as skip (untestable)"""
+        skips = self._skips
+        skips.add(self.current)
+        good = self._good
+        bad = self._bad
+        mid = new = (good + bad) >> 1
+        if new in skips:
+            # Look for the closest non-skipped index in between good and bad,
+            # trying the lower one first
+            below = mid - good
+            above = bad - mid
+            for distance in range(1, max(below, above)):
+                if distance < below and mid - distance not in skips:
+                    new = mid - distance
+                    break
+                if distance < above and mid + distance not in skips:
+                    new = mid + distance
+                    break
+            else:
+                self.reset(self._first_bad, self._first_bad)
+                return None
+        self._invalidate()
+        self.current = new
+        return self.current
+
+    def _invalidate(self):
+        """Drop cached values after good/bad/skips change"""
+        self._cached_variants = self._cached_steps = None
+
+    def steps_left(self):
+        """Report the approximate number of remaining steps"""
+        if self._cached_steps is None:
+            variants = self.variants_left()
+            if variants > 1:
+                # ceil(log2(variants + 1)) without float math
+                self._cached_steps = variants.bit_length()
+            else:
+                self._cached_steps = 0
+        return self._cached_steps
+
+    def variants_left(self):
+        """Report the number of variants"""
+        if self._cached_variants is None:
+            if self._bad is None:
+                self._cached_variants = len(self.values)
+            else:
+                self._cached_variants = (self._bad - self._good -
+                                         len(self._skips))
+        return self._cached_variants
+
+    def reset(self, good=None, bad=None):
+        """Reset the bisection, optionally select good/bad positions"""
+        self._good = 0 if good is None else good
+        self._bad = self.last_index if bad is None else bad
+        self._skips = set()
+        self.update_current()
+        self._invalidate()
+
+    def start(self, good=0):
+        """
+        Start bisecting this axis from ``good`` to the last value
+
+        The first probe is placed according to the bias/start_fraction.
+
+        :param good: Lowest not-yet-tested index
+        :return: The first index to be tested
+        """
+        self.reset(good)
+        self._first_probe()
+        return self.current
+
+    def to_progress(self):
+        """
+        Serialize the mutable state of this axis (see :meth:`from_progress`)
+        """
+        return (_PROGRESS_AXIS.pack(self.current, self._first_bad, self._good,
+                                    self._bad, len(self._skips)) +
+                _pack_varints(sorted(self._skips)))
+
+    @classmethod
+    def from_progress(cls, values, data, offset, bias=False,
+                      start_fraction=0.5):
+        """
+        Reconstruct the axis from :meth:`to_progress` output
+
+        :param values: Values of this axis
+        :param data: Serialized progress
+        :param offset: Where the axis record starts in ``data``
+        :return: tuple(bisection, offset after the axis record)
+        :raise struct.error: When the data are truncated
+        """
+        bisection = object.__new__(cls)
+        bisection.values = values
+        bisection.last_index = len(values) - 1
+        bisection._bias = bias and cls.is_numeric(values)
+        bisection._start_fraction = start_fraction
+        (bisection.current, bisection._first_bad, bisection._good,
+         bisection._bad, no_skips) = _PROGRESS_AXIS.unpack_from(data, offset)
+        skips, offset = _unpack_varints(data, offset + _PROGRESS_AXIS.size,
+                                        no_skips)
+        bisection._skips = set(skips)
+        bisection._cached_variants = bisection._cached_steps = None
+        return bisection, offset
+
+    def _first_probe(self):
+        """Optionally move the first probe of a new bisection off-center"""
+        if self._bias:
+            # Geometric instead of arithmetic mean
+            probe = math.isqrt((self._good + 1) * (self._bad + 1)) - 1
+        elif self._start_fraction != 0.5:
+            probe = self._good + int((self._bad - self._good) *
+                                     self._start_fraction)
+        else:
+            return
+        if self._good < probe < self._bad:
+            self.current = probe
+
+
+# Bisection method to replay a previously logged status
+_REPLAY_ACTION = {BisectionStatus.GOOD: Bisection.good,
+                  BisectionStatus.BAD: Bisection.bad,
+                  BisectionStatus.SKIP: Bisection.skip}
+
+
+class Bisections:
+    """
+    Keeps track of a bisection over multiple arrays
+    """
+    __slots__ = ('options', 'args', '_log', '_log_index', '_active',
+                 '_current', 'dirty')
+
+    def __init__(self, args, bias=False, start_fraction=0.5):
+        self.options = {"bias": bias, "start_fraction": start_fraction}
+        self.args = [Bisection(arg, bias, start_fraction) for arg in args]
+        self._log = []
+        # Status of the logged variants by tuple(identifier)
+        self._log_index = {}
+        # Initialize log with first and last checks (trust the user)
+        self._append_log(BisectionStatus.GOOD, [0 for _ in args])
+        self._append_log(BisectionStatus.BAD, [len(_) - 1 for _ in args])
+        self._active = -1
+        # Indexes of the current variant, synced in _postprocess_current
+        self._current = list(map(_CURRENT_INDEX, self.args))
+        self._postprocess_current(None)
+        # Whether there are changes not yet recorded by dump_progress
+        self.dirty = True
+
+    def _append_log(self, status, identifier):
+        """Record the status of the variant"""
+        entry = BisectionLogEntry(status, tuple(identifier))
+        self._log.append(entry)
+        self._log_index.setdefault(entry.identifier, status)
+
+    def current(self):
+        """Reports the current variant indexes"""
+        return list(self._current)
+
+    def value(self, variant=None):
+        """Reports parameters of the current variant"""
+        if variant is None:
+            return self.current_value()
+        return [self.args[i].value(index)
+                for i, index in enumerate(variant)]
+
+    def current_value(self):
+        """Reports parameters of the current variant"""
+        return [arg.value() for arg in self.args]
+
+    def good(self):
+        """Mark the current step as good (go to right)"""
+        if self._active >= len(self.args):
+            return None
+        self.dirty = True
+        self._append_log(BisectionStatus.GOOD, self._current)
+        #self.args[self._active].no_good = False
+        if self.args[self._active].current == 0:
+            # It won't reproduce with the first argument, which means we have
+            # to investigate this item. Start its bisection
+            return self._postprocess_current(self.args[self._active].start())
+        this = self.args[self._active].good()
+        return self._postprocess_current(this)
+
+    def bad(self):
+        """Mark the current step as bad (go to left)"""
+        if self._active >= len(self.args):
+            return None
+        self.dirty = True
+        self._append_log(BisectionStatus.BAD, self._current)
+        if self.args[self._active].current == 0:
+            # Still failing with the first argument, this axis is irrelevant,
+            # skip it
+            self.args[self._active].reset(0, 0)
+            return self._postprocess_current(None)
+        this = self.args[self._active].bad()
+        return self._postprocess_current(this)
+
+    def skip(self):
+        """Mark the current step as skip (untestable)"""
+        if self._active >= len(self.args):
+            return None
+        self.dirty = True
+        self._append_log(BisectionStatus.SKIP, self._current)
+        this = self.args[self._active].skip()
+        return self._postprocess_current(this)
+
+    def _postprocess_current(self, this):
+        """
+        Perform common checks on the next variant
+
+        Based on the values it can skip to the next axis, report the previously
+        logged status or simply return the next "current" variant
+
+        :param this: Value of the next index of the current active axis (7)
+        :return: next "current" variant (0-0-7)
+        """
+        while True:
+            if 0 <= self._active < len(self.args):
+                self._current[self._active] = self.args[self._active].current
+            if this is None:  # or this == 0:
+                self._active += 1
+                if self._active >= len(self.args):
+                    # TODO: Investigate improvements for skip columns cases
+                    """
+                    # In case of many skips certain columns might have not been
+                    # tested yet
+                    for i, arg in enumerate(self.args):
+                        '''
+                        if arg._good == arg.last_index:
+                            variant = [_.current if i == j else 0
+                                       for j, _ in enumerate(self.args)]
+                            if variant not in self._log:
+                                arg.reset()
+                                arg.current = 0
+                                return self.current()
+                        '''
+                        if getattr(arg, 'no_good', False) is True:
+                            # I need to go up on these
+                            #import pydevd
+                            #pydevd.settrace("127.0.0.1", True, True)
+                            #for _ in self.args:
+                            #    if _.no_good is True:
+                            #        _.reset()
+                            #        _.curret = _.last_index
+                            arg.current = 0
+                            # Set this one to False to skip it next time
+                            arg.no_good = False
+                            self._active = i
+                            return self.current()
+                    """
+                    return None
+                # Initialize the next axis to 0 to try if it is important
+                self.args[self._active].current = 0
+                this = 0
+                continue
+            status = self._log_index.get(tuple(self._current))
+            if status is not None:
+                arg = self.args[self._active]
+                if (status is BisectionStatus.GOOD and arg.current == 0 and
+                        arg.last_index > 0):
+                    # Known good first value, start bisecting this axis
+                    # (the first value is already tested)
+                    this = arg.start(1)
+                else:
+                    this = _REPLAY_ACTION[status](arg)
+                continue
+            return self.current()
+
+    def steps_left(self):
+        """Report how many steps to test"""
+        return (sum(_.steps_left() for _ in self.args) +
+                len(self.args) - self._active)
+
+    def variants_left(self):
+        """Report how many variants to test"""
+        variants = [_.variants_left() or 1 for _ in self.args[self._active:]]
+        if not variants:
+            return 0
+        return math.prod(variants)
+
+    def log(self):
+        """Report bisection log"""
+        return('\n'.join(str(entry) for entry in self._log))
+
+    def dump_progress(self):
+        """
+        Serialize the mutable part of the bisection (everything but values)
+
+        :return: bytes to be passed to :meth:`load_progress`
+        """
+        out = bytearray(_PROGRESS_HEADER.pack(_PROGRESS_MAGIC, len(self.args),
+                                              self._active, len(self._log)))
+        for arg in self.args:
+            out += arg.to_progress()
+        for entry in self._log:
+            out.append(entry.status.value)
+            out += _pack_varints(entry.identifier)
+        return bytes(out)
+
+    @staticmethod
+    def _unpack_log(data, offset, no_log, no_args):
+        """Unpack ``no_log`` log entries serialized by :meth:`dump_progress`"""
+        log = []
+        for _ in range(no_log):
+            status = BisectionStatus(data[offset])
+            identifier, offset = _unpack_varints(data, offset + 1, no_args)
+            log.append(BisectionLogEntry(status, tuple(identifier)))
+        return log
+
+    @classmethod
+    def load_progress(cls, values, data, **options):
+        """
+        Reconstruct bisection from values and :meth:`dump_progress` output
+
+        :param values: List of values of each axis
+        :param data: Serialized progress
+        :param options: Options used to create the original bisection
+        :raise ValueError: When the data are malformed
+        """
+        try:
+            magic, no_args, active, no_log = _PROGRESS_HEADER.unpack_from(data)
+            if magic != _PROGRESS_MAGIC or no_args != len(values):
+                raise ValueError("Incorrect bisecter progress header")
+            offset = _PROGRESS_HEADER.size
+            args = []
+            for axis_values in values:
+                arg, offset = Bisection.from_progress(axis_values, data,
+                                                      offset, **options)
+                args.append(arg)
+            log = cls._unpack_log(data, offset, no_log, no_args)
+        except (struct.error, IndexError) as details:
+            raise ValueError(f"Truncated bisecter progress: {details}") \
+                from details
+        bisection = object.__new__(cls)
+        bisection.options = options
+        bisection.args = args
+        bisection._log = log
+        # First logged status wins (same as _append_log)
+        bisection._log_index = {_.identifier: _.status for _ in reversed(log)}
+        bisection._active = active
+        bisection._current = list(map(_CURRENT_INDEX, args))
+        bisection.dirty = False
+        return bisection
@@ -14,12 +14,26 @@
 # Author: Lukas Doktor <ldoktor@redhat.com>
 """Utils used in the Bisecter tool"""
 
-import itertools
 import json
+import os
 import re
+import signal
 import subprocess
 import urllib.parse
-import urllib.request
+
+
+#: Prefix of the extended arguments handled by range_beaker
+BEAKER_PREFIX = "beaker://"
+#: Prefix of the extended arguments handled by range_url
+URL_PREFIX = "url://"
+
+_RE_TEMPLATE = re.compile(r'\{?\{(-?\d+)\}\}?')
+_RE_HREF = re.compile(rb'href="([^"]+)"[^>]*>([^<]*)<')
+_RE_METACHARS = frozenset('.^$*+?{}[]|()\\')
+#: Signals ignored by Python which should be default in executed commands
+_RESTORE_SIGNALS = tuple(getattr(signal, name)
+                         for name in ('SIGPIPE', 'SIGXFSZ')
+                         if hasattr(signal, name))
 
 
 class ReplaceIndexError(IndexError):
@@ -36,6 +50,61 @@ class ReplaceIndexError(IndexError):
                 f"for values {self.values}")
 
 
+def compile_template(strings):
+    """
+    Parse strings once for repeated :func:`simple_template`-like replacing
+
+    :param strings: List of strings to be replaced
+    :return: Function accepting values and returning list of strings with
+             {\\d} entries replaced with provided values
+    """
+    compiled = []
+    for item in strings:
+        if '{' not in item:
+            compiled.append(item)
+            continue
+        # Literal strings and (match, index, prefix, suffix) replacements
+        fragments = []
+        end = 0
+        for matchobj in _RE_TEMPLATE.finditer(item):
+            fragments.append(item[end:matchobj.start()])
+            match_str = matchobj.group(0)
+            if match_str.startswith('{{') and match_str.endswith('}}'):
+                fragments.append(match_str[1:-1])
+            elif match_str.startswith('{{'):
+                fragments.append((matchobj, int(matchobj.group(1)), '{', ''))
+            elif match_str.endswith('}}'):
+                fragments.append((matchobj, int(matchobj.group(1)), '', '}'))
+            else:
+                fragments.append((matchobj, int(matchobj.group(1)), '', ''))
+            end = matchobj.end()
+        fragments.append(item[end:])
+        compiled.append(fragments)
+
+    def render(values):
+        str_values = [str(_) for _ in values]
+        out = []
+        for fragments in compiled:
+            if isinstance(fragments, str):
+                out.append(fragments)
+                continue
+            parts = []
+            for fragment in fragments:
+                if isinstance(fragment, str):
+                    parts.append(fragment)
+                    continue
+                matchobj, num, prefix, suffix = fragment
+                try:
+                    parts.append(prefix + str_values[num] + suffix)
+                except IndexError as exc:
+                    raise ReplaceIndexError(matchobj, values,
+                                            strings) from exc
+            out.append(''.join(parts))
+        return out
+
+    return render
+
+
 def simple_template(strings, values):
     """
     Simple templating to replace {\\d} occurrences with items in values
@@ -44,30 +113,52 @@ def simple_template(strings, values):
     :param values: Values to be used in teplating
     :return: List of strings with {\\d} entries replaced with provided values
     """
+    return compile_template(strings)(values)
+
+
+def run_command(args):
+    """
+    Execute command inheriting stdin/stdout/stderr and wait for it
+
+    Uses :func:`os.posix_spawnp` when available to avoid the per-call
+    overhead of :class:`subprocess.Popen`.
 
-    def do_template(matchobj):
-        match_str = matchobj.group(0)
-        if match_str.startswith('{{') and match_str.endswith('}}'):
-            return match_str[1:-1]
-        num = int(matchobj.group(1))
-        try:
-            replaced = str(values[num])
-        except IndexError as exc:
-            raise ReplaceIndexError(matchobj, values, strings) from exc
-        if match_str.startswith('{{'):
-            replaced = '{' + replaced
-        elif match_str.endswith('}}'):
-            replaced += '}'
-        return replaced
-
-    pattern = r'\{?\{(-?\d+)\}\}?'
-    return [re.sub(pattern, do_template, item) for item in strings]
+    :param args: Command to be executed (list of arguments)
+    :return: Exit code (negative signal number when killed by a signal)
+    """
+    if not hasattr(os, "posix_spawnp"):
+        return subprocess.run(args, check=False).returncode
+    # Python ignores SIGPIPE/SIGXFSZ, restore the defaults like subprocess
+    # does (restore_signals) so commands like "cmd | head" behave normally
+    pid = os.posix_spawnp(args[0], args, os.environ,
+                          setsigdef=_RESTORE_SIGNALS, setsigmask=())
+    try:
+        _, status = os.waitpid(pid, 0)
+    except BaseException:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        raise
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
 
 
 def esplit(sep, line, maxsplit=0):
     """Split line by {sep} allowing \\ escapes"""
-    return [_.replace(f'\\{sep}', sep)
-            for _ in re.split(f'(?<!\\\\){sep}', line, maxsplit)]
+    escaped = f'\\{sep}'
+    out = []
+    start = pos = 0
+    while not maxsplit or len(out) < maxsplit:
+        pos = line.find(sep, pos)
+        if pos < 0:
+            break
+        if pos and line[pos - 1] == '\\':
+            pos += 1
+            continue
+        out.append(line[start:pos].replace(escaped, sep))
+        start = pos = pos + len(sep)
+    out.append(line[start:].replace(escaped, sep))
+    return out
 
 
 def range_beaker(arg, arch="x86_64", extra_args=None):
@@ -84,7 +175,7 @@ def range_beaker(arg, arch="x86_64", extra_args=None):
     """
 
     def parse_arg(arg):
-        args = esplit(':', arg[9:], 2)
+        args = esplit(':', arg[len(BEAKER_PREFIX):], 2)
         limit = 100
         if len(args) == 3:
             return args[0], args[1], int(args[2])
@@ -101,8 +192,7 @@ def range_beaker(arg, arch="x86_64", extra_args=None):
         Get common part of first and last, adding n/d for nightly/daily builds
         """
         if last:
-            common = ''.join(char[0] for char in itertools.takewhile(
-                lambda _: _[0] == _[1], zip(first, last)))
+            common = os.path.commonprefix((first, last))
             if 'n' in first and 'n' in last:
                 return common + '%n%'
             if 'd' in first and 'd' in last:
@@ -115,21 +205,23 @@ def range_beaker(arg, arch="x86_64", extra_args=None):
         return first + '%'
 
     def distros_from_bkr_json(distros, first, last):
-        idistros = iter(distros)
         out = []
-        # Look for first
-        for distro in idistros:
-            dist = distro.get("distro_name")
-            if dist and dist.startswith(first):
-                out.append(dist)
-                break
-        # Add all distros until last
-        for distro in idistros:
-            if not distro.get("distro_name"):
+        seen = set()
+        for distro in distros:
+            name = distro.get("distro_name")
+            if not name:
+                continue
+            if not out:
+                # Look for first (not checked against last)
+                if name.startswith(first):
+                    out.append(name)
+                    seen.add(name)
                 continue
-            if distro["distro_name"] not in out:
-                out.append(distro["distro_name"])
-            if last and distro["distro_name"].startswith(last):
+            # Add all distros until last
+            if name not in seen:
+                out.append(name)
+                seen.add(name)
+            if last and name.startswith(last):
                 break
         return out
 
@@ -143,7 +235,18 @@ def range_beaker(arg, arch="x86_64", extra_args=None):
     return distros_from_bkr_json(json.loads(ret.stdout), first, last)
 
 
-def range_url(arg):
+def _prefix_matcher(pattern):
+    """
+    Callable equivalent to ``re.match(pattern, string)`` in boolean context
+
+    Avoids the regex engine when the pattern is a plain literal.
+    """
+    if _RE_METACHARS.isdisjoint(pattern):
+        return lambda string: string.startswith(pattern)
+    return re.compile(pattern).match
+
+
+def range_url(arg, cache=None):
     """
     Parse argument into list of links
 
@@ -161,29 +264,41 @@ def range_url(arg):
         * url://example.org:kernel:+0:+5 (report first 5 links - using +/- is
           mandatory!) (links_containing_kernel[:5])
 
+    :param cache: optional dict to reuse fetched pages between calls
     :return: list of individual links (eg.:
         ["example.org/foo", "example.org/bar"])
     """
 
     def parse_arg(arg):
-        args = esplit(':', arg[6:], 3)
+        args = esplit(':', arg[len(URL_PREFIX):], 3)
         if len(args) < 4:
             args += [None, ] * (4 - len(args))
         for i in (2, 3):
-            if not args[i]:
-                continue
-            if args[i].startswith('+'):
-                args[i] = int(args[i])
-            elif args[i].startswith('-'):
+            if args[i] and args[i].startswith(('+', '-')):
                 args[i] = int(args[i])
         return args
 
+    def get_links(page):
+        # Only import the (rather heavy) http stack when needed
+        from urllib import request  # pylint: disable=C0415
+        with request.urlopen(page) as req:
+            content = req.read()
+        # Only decode the matches (ASCII bytes never occur inside UTF-8
+        # multi-byte sequences so it's safe to match on raw bytes)
+        return [(href.decode('utf-8'), text.decode('utf-8'))
+                for href, text in _RE_HREF.findall(content)]
+
     def get_filtered_links(page, filt):
-        with urllib.request.urlopen(page) as req:
-            content = req.read().decode('utf-8')
-        if filt is None:
-            filt = ''
-        return re.findall(f"href=\"([^\"]+)\"[^>]*>({filt}[^<]*)<", content)
+        if cache is None:
+            links = get_links(page)
+        else:
+            links = cache.get(page)
+            if links is None:
+                links = cache[page] = get_links(page)
+        if not filt:
+            return links
+        match = _prefix_matcher(filt)
+        return [link for link in links if match(link[1])]
 
     def apply_ranges(links, first, last):
         if isinstance(first, int):
@@ -198,23 +313,33 @@ def range_url(arg):
             offset2 = None
         ilinks = iter(links[offset1:offset2])
         out = []
+        seen = set()
         # Look for first
         if first:
+            match_first = _prefix_matcher(first)
             for link in ilinks:
-                if link[1] and re.match(first, link[1]):
+                if link[1] and match_first(link[1]):
                     out.append(link[0])
+                    seen.add(link[0])
                     break
+        match_last = _prefix_matcher(last) if last else None
         # Add all links until last
         for link in ilinks:
             if not link[0]:
                 continue
-            if link[0] not in out:
+            if link[0] not in seen:
                 out.append(link[0])
-            if last and re.match(last, link[1]):
+                seen.add(link[0])
+            if match_last and match_last(link[1]):
                 break
         return out
 
+    def join(link):
+        # Absolute links need no joining
+        if link.startswith(('http://', 'https://')):
+            return link
+        return urllib.parse.urljoin(page, link)
+
     page, filt, first, last = parse_arg(arg)
     links = get_filtered_links(page, filt)
-    return [urllib.parse.urljoin(page, link)
-            for link in apply_ranges(links, first, last)]
+    return list(map(join, apply_ranges(links, first, last)))
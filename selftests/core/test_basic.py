@@ -13,8 +13,15 @@
 # Copyright: Red Hat Inc. 2020
 # Author: Lukas Doktor <ldoktor@redhat.com>
 
+import contextlib
+import importlib.util
+import io
+import json
+import math
 import os
+import shlex
 import shutil
+import signal
 import subprocess
 import sys
 import tempfile
@@ -23,17 +30,42 @@ import unittest
 
 import bisecter
 
-try:
-    import yaml
-    YAML_INSTALLED = True
-    del yaml
-except ImportError:
-    YAML_INSTALLED = False
+YAML_INSTALLED = importlib.util.find_spec("yaml") is not None
 
-BISECTER = os.environ.get("UNITTEST_BISECTER_CMD",
-                          f"{sys.executable} -m bisecter")
+if "UNITTEST_BISECTER_CMD" in os.environ:
+    BISECTER = shlex.split(os.environ["UNITTEST_BISECTER_CMD"])
+    IN_PROCESS = False
+else:
+    BISECTER = [sys.executable, "-m", "bisecter"]
+    IN_PROCESS = True
 TEST_SH_PATH = os.path.join(os.path.dirname(__file__), "assets",
                             "test.sh")
+# Tests spawning additional processes are only executed on demand
+SLOW_TESTS = os.environ.get("BISECTER_SLOW") == "1"
+# Keep the frequently rewritten state files in memory when possible
+if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+    TMPDIR = "/dev/shm"
+else:
+    TMPDIR = None
+
+
+def fake_test_sh(args):
+    """ Python equivalent of the assets/test.sh used by run --runner-module """
+    if args[0] == 'FAILURE':
+        return 135
+    first, second, third = map(int, args)
+    if first == second == third == 99:
+        return 1
+    if second > 3:
+        return 125
+    if first < 10 and second < 20 and third < 77:
+        return 0
+    return 1
+
+
+def none_runner(_args):
+    """ Incorrect runner returning None instead of exit code """
+    return None
 
 
 class BisectionsTest(unittest.TestCase):
@@ -41,8 +73,7 @@ class BisectionsTest(unittest.TestCase):
     def check_log_for_duplicities(self, bisect):
         """ Check the internal Bisections._log for duplicate entries """
         log = bisect._log       # pylint: disable=W0212
-        unique = set("-".join(str(ident) for ident in _.identifier)
-                    for _ in log)
+        unique = set(_.identifier for _ in log)
         self.assertEqual(len(unique), len(log), "Some variant was tested "
                          f"multiple times\n{unique}\n\n\n{log}")
         if len(unique) != len(log):
@@ -80,14 +111,11 @@ class BisectionsTest(unittest.TestCase):
         # Only 0, 0, 0 is matching
         self.basic_workflow(args, lambda x: x == [0, 0, 0], [0, 0, 1])
         # Single parameter affects bisection
-        self.basic_workflow(args, lambda x: x[0] <= 1, [2, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 2, [3, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 3, [4, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 4, [5, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 5, [6, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 6, [7, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 7, [8, 0, 0])
-        self.basic_workflow(args, lambda x: x[0] <= 8, [9, 0, 0])
+        for threshold in range(1, 9):
+            with self.subTest(threshold=threshold):
+                self.basic_workflow(args,
+                                    lambda x, thr=threshold: x[0] <= thr,
+                                    [threshold + 1, 0, 0])
         # Only last one is failing
         self.basic_workflow(args, lambda x: x[0] <= 9, [9, 14, 12])
         # Combination of parameters affect bisection together
@@ -128,6 +156,40 @@ class BisectionsTest(unittest.TestCase):
         bisect.good()
         # Bisection complete, first bad should be...
         self.assertEqual([1, 2, 3, 5, 6, 7, 'A', 9, 'F', 11], bisect.value())
+        # Further results are ignored
+        log = bisect.log()
+        self.assertIsNone(bisect.bad())
+        self.assertEqual(log, bisect.log())
+        self.assertEqual(0, bisect.steps_left())
+
+    def test_progress(self):
+        args = [list(range(10)), "abcdefghijklmno", list(range(0, 1300, 10))]
+        bisect = bisecter.Bisections(args)
+        for action in ("bad", "good", "skip", "bad", "skip", "good"):
+            getattr(bisect, action)()
+            data = bisect.dump_progress()
+            restored = bisecter.Bisections.load_progress(args, data)
+            self.assertEqual(bisect.current(), restored.current())
+            self.assertEqual(bisect.log(), restored.log())
+            self.assertEqual(data, restored.dump_progress())
+        self.assertRaises(ValueError, bisecter.Bisections.load_progress,
+                          args, data[:-1])
+        self.assertRaises(ValueError, bisecter.Bisections.load_progress,
+                          args[:-1], data)
+
+
+class BisectionLogEntryTest(unittest.TestCase):
+    def test_eq(self):
+        good = bisecter.BisectionLogEntry(bisecter.BisectionStatus.GOOD,
+                                          (1, 2))
+        bad = bisecter.BisectionLogEntry(bisecter.BisectionStatus.BAD,
+                                         (1, 2))
+        self.assertEqual(good, bad)
+        self.assertEqual(good, "1-2")
+        self.assertEqual(good, [1, 2])
+        self.assertEqual("GOOD 1-2", str(good))
+        # __eq__ matches str/list, there is no consistent hash
+        self.assertRaises(TypeError, hash, good)
 
 
 class BisectionTest(unittest.TestCase):
@@ -137,166 +199,387 @@ class BisectionTest(unittest.TestCase):
         bisect.reset()
         self.assertEqual("s", bisect.value())
 
+    def test_skip(self):
+        bisect = bisecter.Bisection(list(range(10)))
+        bisect.reset(6, 9)
+        self.assertEqual(7, bisect.current)
+        # Lower neighbour is the known good one, go up
+        self.assertEqual(8, bisect.skip())
+        self.assertEqual(2, bisect.variants_left())
+        # Nothing left to test in between good and bad
+        self.assertIsNone(bisect.skip())
+        self.assertEqual(9, bisect.current)
+
+    def test_steps_left(self):
+        bisect = bisecter.Bisection(range(1 << 41))
+        variants = list(range(1, 1 << 12))
+        for power in range(12, 41):
+            variants.extend(((1 << power) - 1, 1 << power, (1 << power) + 1))
+        for variant in variants:
+            bisect.reset(0, variant)
+            self.assertEqual(math.ceil(math.log2(variant + 1))
+                             if variant > 1 else 0, bisect.steps_left())
+
+    def test_bias(self):
+        bisect = bisecter.Bisection([str(_) for _ in range(100)], bias=True)
+        self.assertEqual(9, bisect.start())
+        self.assertEqual("9", bisect.value())
+        bisect.good()
+        self.assertEqual("54", bisect.value())
+        # Bias is only applied to numeric axes
+        bisect = bisecter.Bisection(["a"] + list(range(99)), bias=True)
+        bisect.start()
+        self.assertEqual(48, bisect.value())
+        # Plain reset does not move the probe
+        bisect = bisecter.Bisection([str(_) for _ in range(100)], bias=True)
+        bisect.reset()
+        self.assertEqual("49", bisect.value())
+        # First probe of the second axis is biased too
+        bisect = bisecter.Bisections([["0", "1", "2", "3"],
+                                      [str(_) for _ in range(100)]],
+                                     bias=True)
+        self.assertEqual([0, 99], bisect.current())
+        self.assertEqual([1, 99], bisect.good())
+        self.assertEqual([1, 0], bisect.bad())
+        self.assertEqual([1, 9], bisect.good())
+
+    def test_start_fraction(self):
+        bisect = bisecter.Bisection(list(range(100)), start_fraction=0.33)
+        bisect.start()
+        self.assertEqual(32, bisect.value())
+        bisect.bad()
+        self.assertEqual(16, bisect.value())
+        # Single axis starts with the known-good first value
+        bisect = bisecter.Bisections([list(range(100))], start_fraction=0.2)
+        self.assertEqual([20], bisect.current())
+
 
 class BisecterMockedTest(unittest.TestCase):
     def test_extended_args(self):
-        def join_args(*args):
+        def join_args(*args, **_):
             return f'called with {args}'
         eargs = ['1,2,3', 'range(100,110,2)', 'url://some_page',
                  'beaker://Distro:-10']
-        with mock.patch('bisecter.utils.range_beaker', join_args):
-            with mock.patch('bisecter.utils.range_url', join_args):
-                bisect = bisecter.Bisecter()
-                # Only check the range_* functions are called, those features
-                # are tested in test_utils
-                self.assertEqual([['1', '2', '3'],
-                                  ['100', '102', '104', '106', '108'],
-                                  "called with ('url://some_page',)",
-                                  "called with ('beaker://Distro:-10',)"],
-                                  bisect._parse_extended_args(eargs))
+        with mock.patch.multiple('bisecter.utils', range_beaker=join_args,
+                                 range_url=join_args):
+            bisect = bisecter.Bisecter()
+            # Only check the range_* functions are called, those features
+            # are tested in test_utils
+            self.assertEqual([['1', '2', '3'],
+                              ['100', '102', '104', '106', '108'],
+                              "called with ('url://some_page',)",
+                              "called with ('beaker://Distro:-10',)"],
+                              bisect._parse_extended_args(eargs))
 
 
 class BisecterTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmpdir = tempfile.TemporaryDirectory(prefix="bisecter-selftest",
+                                                  dir=TMPDIR)
+        cls.tmpdir = cls._tmpdir.name
+        cls.statefile = os.path.join(cls.tmpdir, "statefile")
+        cls.bisect = BISECTER + ["--state-file", cls.statefile]
+        # Expanding and storing the 100x100x100 bisection is the most
+        # expensive step, do it once and copy the state files per test
+        cls.seed = os.path.join(cls.tmpdir, "seed")
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(io.StringIO()):
+            ret = bisecter.main(["--state-file", cls.seed, "start", "-E",
+                                 "range(100)", "range(100)",
+                                 "range(0,100,    1   )"])
+        assert ret == 0, f"Failed to create the seed statefile ({ret})"
+        cls.seed_stdout = stdout.getvalue()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmpdir.cleanup()
+
     def setUp(self):
-        self.tmpdir = tempfile.mkdtemp(prefix="bisecter-selftest")
-        self.statefile = os.path.join(self.tmpdir, "statefile")
-        self.bisect = f"{BISECTER} --state-file {self.statefile}"
+        # The tmpdir is shared by the whole class, remove per-test files
+        for path in (self.statefile, self.statefile + ".args",
+                     self.statefile + ".tmp",
+                     os.path.join(self.tmpdir, "args.yml")):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.server = None
+
+    def run_cmd(self, *argv, check=True):
+        """
+        Execute bisecter in-process using :func:`bisecter.main`
+
+        When custom UNITTEST_BISECTER_CMD is set it is executed instead.
 
+        :return: subprocess.CompletedProcess-like result (bytes outputs)
+        """
+        if not IN_PROCESS:
+            return subprocess.run(self.bisect + list(argv),
+                                  capture_output=True, check=check)
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            ret = bisecter.main(["--state-file", self.statefile] +
+                                list(argv))
+        out = subprocess.CompletedProcess(argv, ret,
+                                          stdout.getvalue().encode(),
+                                          stderr.getvalue().encode())
+        if check:
+            out.check_returncode()
+        return out
+
+    def serve(self, command, check=True):
+        """
+        Execute bisecter command using a shared "bisecter serve" process
+
+        :return: subprocess.CompletedProcess-like result (bytes outputs)
+        """
+        if self.server is None:
+            self.server = subprocess.Popen(self.bisect + ["serve"],
+                                           stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL)
+        self.server.stdin.write(command.encode() + b'\n')
+        self.server.stdin.flush()
+        result = json.loads(self.server.stdout.readline())
+        out = subprocess.CompletedProcess(command, result["returncode"],
+                                          result["stdout"].encode(),
+                                          result["stderr"].encode())
+        if check:
+            out.check_returncode()
+        return out
+
+    def copy_seed(self):
+        """ Use the pre-started bisection from :meth:`setUpClass` """
+        shutil.copyfile(self.seed, self.statefile)
+        shutil.copyfile(self.seed + ".args", self.statefile + ".args")
+
+    def test_start_output(self):
+        self.assertIn("0 99 99", self.seed_stdout)
+
+    def test_smoke_cli(self):
+        out = self.serve("start 1,2,3,4 a,b,c")
+        self.assertIn(b"1 c", out.stdout)
+        out = self.serve("bad")
+        self.assertIn(b"1 b", out.stdout)
+        out = self.serve("good")
+        self.assertIn(b"Bisection complete", out.stdout)
+        self.serve("reset")
+        self.assertFalse(os.path.exists(self.statefile))
+        # Malformed line is reported and the server keeps running
+        out = self.serve('args "unterminated', check=False)
+        self.assertEqual(out.returncode, 255, out)
+        self.assertIn(b"Failed to parse command", out.stderr)
+        out = self.serve("args", check=False)
+        self.assertIn(b" start' first", out.stderr)
+
+    def test_empty_extended_arg(self):
+        out = self.run_cmd("start", "-E", "1,2", "range(5,5)", check=False)
+        self.assertEqual(out.returncode, 255, out)
+        self.assertIn(b"Extended argument range(5,5) resulted in empty list",
+                      out.stderr)
+        self.assertNotIn(b"Traceback", out.stderr)
+        self.assertFalse(os.path.exists(self.statefile))
+
+    def test_main_exception(self):
+        stderr = io.StringIO()
+        with mock.patch.object(bisecter.Bisecter, "log",
+                               side_effect=RuntimeError("Unexpected")), \
+                contextlib.redirect_stderr(stderr):
+            ret = bisecter.main(["--state-file", self.statefile, "log"])
+        self.assertEqual(1, ret)
+        self.assertIn("Traceback", stderr.getvalue())
+        self.assertIn("RuntimeError: Unexpected", stderr.getvalue())
+
+    @unittest.skipUnless(IN_PROCESS, "Requires in-process execution")
+    def test_incorrect_runner(self):
+        self.run_cmd("start", "1,2,3")
+        with mock.patch("importlib.import_module",
+                        side_effect=SyntaxError("invalid syntax")):
+            out = self.run_cmd("run", "--runner-module", "broken:runner",
+                               check=False)
+        self.assertEqual(out.returncode, 255, out)
+        self.assertIn(b"Failed to load runner broken:runner: invalid syntax",
+                      out.stderr)
+        out = self.run_cmd("run", "--runner-module",
+                           f"{__name__}:none_runner", check=False)
+        self.assertEqual(out.returncode, 255, out)
+        self.assertIn(b"returned None instead of int", out.stderr)
+
+    @unittest.skipUnless(IN_PROCESS, "Requires in-process execution")
+    def test_serve_in_process(self):
+        with tempfile.TemporaryFile() as tmp:
+            sys.stdout.flush()
+            orig_stdout = os.dup(1)
+            os.dup2(tmp.fileno(), 1)
+            try:
+                with mock.patch("sys.stdin", io.StringIO("id\n")):
+                    ret = bisecter.main(["--state-file", self.statefile,
+                                         "serve"])
+                fd1 = os.fstat(1)
+            finally:
+                os.dup2(orig_stdout, 1)
+                os.close(orig_stdout)
+            self.assertEqual(0, ret)
+            # The original stdout is restored after serving
+            self.assertTrue(os.path.samestat(fd1, os.fstat(tmp.fileno())))
+            tmp.seek(0)
+            result = json.loads(tmp.read())
+        self.assertEqual(255, result["returncode"], result)
+
+    def test_run_sh(self):
+        # Short "run" executing a real command (test_basic_workflow is slow)
+        self.run_cmd("start", "1,2,3,4,5,6,7,8")
+        out = self.run_cmd("run", "sh", "-c",
+                           'yes | head -1 >/dev/null && test "$0" -lt 6')
+        self.assertIn(b"first bad combination is:\n6\n", out.stdout)
+        self.assertIn(b"Bisecter: GOOD 5", out.stderr)
+
+    @unittest.skipUnless(SLOW_TESTS, "set BISECTER_SLOW=1")
     def test_basic_workflow(self):
-        bisect = self.bisect
-        out = subprocess.run(f"{bisect} start -E 'range(100)' "
-                             "'range(100)' 'range(0,100,    1   )'",
-                             capture_output=True, check=True, shell=True)
-        self.assertIn(b"0 99 99", out.stdout)
-        out = subprocess.run(f"{bisect} bad", capture_output=True, check=True,
-                             shell=True)
+        self.copy_seed()
+        out = self.serve("bad")
         self.assertIn(b"0 0 99", out.stdout)
-        out = subprocess.run(f"{bisect} good", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("good")
         self.assertIn(b"0 49 99", out.stdout)
-        out = subprocess.run(f"{bisect} bad", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("bad")
         self.assertIn(b"0 24 99", out.stdout)
-        out = subprocess.run(f"{bisect} bad", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("bad")
         self.assertIn(b"0 12 99", out.stdout)
-        out = subprocess.run(f"{bisect} bad", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("bad")
         self.assertIn(b"0 6 99", out.stdout)
-        out = subprocess.run(f"{bisect} bad", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("bad")
         self.assertIn(b"0 3 99", out.stdout)
-        out = subprocess.run(f"{bisect} skip", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("skip")
         self.assertIn(b"0 2 99", out.stdout)
-        out = subprocess.run(f"{bisect} run {TEST_SH_PATH}",
-                             capture_output=True, check=True, shell=True)
+        out = self.serve(f"run {TEST_SH_PATH}")
         self.assertIn(b"0 1 77", out.stdout)
-        out = subprocess.run(f"{bisect} args", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("args")
         self.assertIn(b"0 1 77", out.stdout)
-        out = subprocess.run(f"{bisect} args -r -i 9-8-7", capture_output=True,
-                             check=True, shell=True)
+        out = self.serve("args -r -i 9-8-7")
         self.assertIn(b"['9', '8', '7']", out.stdout)
-        out = subprocess.run(f"{bisect} args -i 9999-999",
-                             capture_output=True, check=False, shell=True)
+        out = self.serve("args -i 9999-999", check=False)
         self.assertEqual(out.returncode, 255)
         self.assertIn(b"Incorrect id", out.stderr)
-        out = subprocess.run(f"{bisect} id", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("id")
         self.assertIn(b"0-1-77", out.stdout)
-        out = subprocess.run(f"{bisect} log", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("log")
         self.assertEqual(out.stdout.count(b'\n'), 21, "Incorrect number of "
                          f"lines in:\n{out.stdout}")
-        out = subprocess.run(f"{bisect} good", capture_output=True, check=True,
-                             shell=True)
+        out = self.serve("good")
         self.assertIn(b"Bisection complete", out.stdout)
         self.assertIn(b"0 1 77", out.stdout)
-        out = subprocess.run(f"{bisect} start foo", capture_output=True,
-                             check=False, shell=True)
+        out = self.serve("start foo", check=False)
         self.assertEqual(out.returncode, 255)
         self.assertIn(b"already in progress", out.stderr)
-        _ = subprocess.run(f"{bisect} reset", capture_output=True,
-                           check=True, shell=True)
-        out = subprocess.run(f"{bisect} reset", capture_output=True,
-                             check=True, shell=True)
+        _ = self.serve("reset")
+        out = self.serve("reset")
         self.assertIn(b"No bisection in", out.stderr)
         self.assertFalse(os.path.exists(self.statefile))
-        out = subprocess.run(f"{bisect} non-existing-command",
-                             capture_output=True, check=False, shell=True)
+        out = subprocess.run(self.bisect + ["non-existing-command"],
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, check=False)
         self.assertEqual(out.returncode, 2, out)
 
     def test_run_with_interruption(self):
-        bisect = self.bisect
-        out = subprocess.run(f"{bisect} start 1,1,1,1,FAILURE,1 0 0",
-                             capture_output=True, check=True, shell=True)
+        sigterm_handler = signal.getsignal(signal.SIGTERM)
+        out = self.run_cmd("start", "1,1,1,1,FAILURE,1", "0", "0")
         self.assertIn(b'1 0 0', out.stdout)
-        out = subprocess.run(f"{bisect} run {TEST_SH_PATH}",
-                             capture_output=True, check=False, shell=True)
+        out = self.run_cmd("run", "--runner-module", "non.existing:runner",
+                           check=False)
+        self.assertEqual(out.returncode, 255, out)
+        self.assertIn(b"Failed to load runner", out.stderr)
+        if IN_PROCESS:
+            # Real test.sh is executed by test_basic_workflow
+            out = self.run_cmd("run", "--runner-module",
+                               f"{__name__}:fake_test_sh", check=False)
+            self.assertIn(f"Runner {__name__}:fake_test_sh returned 135"
+                          .encode(), out.stderr)
+        else:
+            out = self.run_cmd("run", TEST_SH_PATH, check=False)
+            self.assertIn(f"{TEST_SH_PATH} returned 135".encode(),
+                          out.stderr)
         self.assertIn(b"returned 135, interrupting", out.stderr)
-        out = subprocess.run(f"{bisect} log", capture_output=True, check=True,
-                             shell=True)
+        # In-process execution must not leak the SIGTERM handler
+        self.assertEqual(sigterm_handler, signal.getsignal(signal.SIGTERM))
+        out = self.run_cmd("log")
         self.assertEqual(out.stdout.count(b'\n'), 3, "Incorrect number of "
                          f"lines in:\n{out.stdout}")
 
     def test_incorrect_files(self):
-        bisect = self.bisect
-        out = subprocess.run(f"{bisect}{os.path.sep}bad-location start foo",
-                             capture_output=True, check=False, shell=True)
+        out = subprocess.run(BISECTER + ["--state-file",
+                                         os.path.join(self.statefile,
+                                                      "bad-location"),
+                                         "start", "foo"],
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, check=False)
         self.assertIn(b"Failed to open", out.stderr, out)
         self.assertEqual(out.returncode, 255, out)
-        out = subprocess.run(f"{bisect} args",
-                             capture_output=True, check=False, shell=True)
+        out = self.run_cmd("args", check=False)
         self.assertEqual(out.returncode, 255, out)
         self.assertIn(b"Failed to open", out.stderr, out)
         self.assertIn(b" start' first", out.stderr, out)
         with open(self.statefile, 'wb') as state:
             state.write(b'malformed state file')
-        out = subprocess.run(f"{bisect} args",
-                             capture_output=True, check=False, shell=True)
+        out = self.run_cmd("args", check=False)
         self.assertEqual(out.returncode, 255, out)
         self.assertIn(b"Failed to read bisecter state", out.stderr, out)
         os.remove(self.statefile)
 
     @unittest.skipUnless(YAML_INSTALLED, "PyYAML not installed")
     def test_yaml(self):
-        bisect = self.bisect
         yaml_path = os.path.join(self.tmpdir, 'args.yml')
-        out = subprocess.run(f"{bisect} start --from-yaml {yaml_path}",
-                             capture_output=True, check=False, shell=True)
+        load_yaml = bisecter.Bisecter.load_yaml
+        self.assertRaisesRegex(bisecter.BisecterError, "Failed to read",
+                               load_yaml, yaml_path)
+        out = self.run_cmd("start", "--from-yaml", yaml_path, check=False)
         self.assertEqual(out.returncode, 255, out)
         self.assertIn(b"Failed to read", out.stderr, out)
         with open(yaml_path, 'wb') as yaml_fd:
             yaml_fd.write(b"'incorrect yaml")
-        out = subprocess.run(f"{bisect} start --from-yaml {yaml_path}",
-                             capture_output=True, check=False, shell=True)
+        self.assertRaisesRegex(bisecter.BisecterError, "Failed to load",
+                               load_yaml, yaml_path)
+        out = self.run_cmd("start", "--from-yaml", yaml_path, check=False)
         self.assertEqual(out.returncode, 255, out)
         self.assertIn(b"Failed to load", out.stderr, out)
         with open(yaml_path, 'wb') as yaml_fd:
-            yaml_fd.write(b"[[1, 2, 3], [4, 5]]")
-        out = subprocess.run(f"{bisect} start --from-yaml {yaml_path}",
-                             capture_output=True, check=True, shell=True)
+            yaml_fd.write(b"[4, 5]")
+        self.assertRaisesRegex(bisecter.BisecterError,
+                               "Failed to parse arguments", load_yaml,
+                               yaml_path)
+        out = self.run_cmd("start", "--from-yaml", yaml_path, check=False)
+        self.assertIn(b"Failed to parse arguments", out.stderr)
+        self.assertEqual(out.returncode, 255, out)
+        with open(yaml_path, 'wb') as yaml_fd:
+            yaml_fd.write(b"- [1, 2, 3]\n- [4, 5]\n")
+        self.assertEqual([['1', '2', '3'], ['4', '5']], load_yaml(yaml_path))
+        # JSON values have to match the YAML ones
+        with open(yaml_path, 'wb') as yaml_fd:
+            yaml_fd.write(b'[[1e3, 1.0e+3, 1.50, -0, NaN, Infinity], '
+                          b'["a", true, null]]')
+        self.assertEqual([['1e3', '1000.0', '1.5', '0', 'NaN', 'Infinity'],
+                          ['a', 'True', 'None']], load_yaml(yaml_path))
+        with open(yaml_path, 'wb') as yaml_fd:
+            yaml_fd.write(b'[[1.5, 2], ["a"]]')
+        self.assertEqual([['1.5', '2'], ['a']], load_yaml(yaml_path))
+        with open(yaml_path, 'wb') as yaml_fd:
+            yaml_fd.write(b"- [1, 2, 3]\n- [4, 5]\n")
+        out = self.run_cmd("start", "--from-yaml", yaml_path)
         self.assertIn(b'1 5', out.stdout)
         self.assertNotIn(b"WARNING", out.stderr)
-        subprocess.run(f"{bisect} reset", capture_output=True, check=True,
-                       shell=True)
-        out = subprocess.run(f"{bisect} start --from-yaml {yaml_path} 1,2,3",
-                             capture_output=True, check=True, shell=True)
+        self.run_cmd("reset")
+        out = self.run_cmd("start", "--from-yaml", yaml_path, "1,2,3")
         self.assertIn(b'1 5', out.stdout)
         self.assertIn(b"WARNING", out.stderr)
-        subprocess.run(f"{bisect} reset", capture_output=True, check=True,
-                       shell=True)
-        with open(yaml_path, 'wb') as yaml_fd:
-            yaml_fd.write(b"[4, 5]")
-        out = subprocess.run(f"{bisect} start --from-yaml {yaml_path}",
-                             capture_output=True, check=False, shell=True)
-        self.assertIn(b"Failed to parse arguments", out.stderr)
-        self.assertEqual(out.returncode, 255, out)
 
     def tearDown(self):
-        if self.tmpdir:
-            shutil.rmtree(self.tmpdir)
+        if self.server is not None:
+            self.server.stdin.close()
+            self.server.stdout.close()
+            self.server.wait()
 
 
 if __name__ == '__main__':
@@ -14,14 +14,28 @@
 # Author: Lukas Doktor <ldoktor@redhat.com>
 
 import os
+import re
+import signal
 import unittest
 import json
 
 from bisecter import utils
 
+ASSETS = os.path.join(os.path.dirname(__file__), 'assets')
+
 
 class Utils(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ASSETS, 'bkr.json'), 'rb') as fd_bkr:
+            cls.bkr_json = fd_bkr.read()
+        with open(os.path.join(ASSETS, 'koji-kernel.html'), 'rb') as fd_html:
+            cls.koji_html = fd_html.read()
+        with open(os.path.join(ASSETS, 'koji-kernel-links.json'), 'r',
+                  encoding='utf-8') as fd_urls:
+            cls.koji_links = json.load(fd_urls)
+
     def test_simple_template(self):
         strings = ['something', '{1}', 'foo{2}', 'bar{{3}}', 'baz{{3}',
                    'buz{3}}', "FOO{3}}A", "{0}{1}.{2}}--{{-1}"]
@@ -32,19 +46,48 @@ class Utils(unittest.TestCase):
         self.assertRaises(utils.ReplaceIndexError, utils.simple_template,
                           ["{4}"], [0, 1, 2, 3])
 
+    def test_compile_template(self):
+        template = utils.compile_template(["cmd", "{0}", "{{1}}-{1}}"])
+        self.assertEqual(["cmd", "A", "{1}-B}"], template(["A", "B"]))
+        self.assertEqual(["cmd", "1", "{1}-2}"], template([1, 2]))
+        self.assertRaises(utils.ReplaceIndexError, template, ["A"])
+
+    def test_esplit(self):
+        self.assertEqual(["a", "b", "c"], utils.esplit(":", "a:b:c"))
+        self.assertEqual(["a:b", "c"], utils.esplit(":", "a\\:b:c"))
+        self.assertEqual(["a", "b:c"], utils.esplit(":", "a:b:c", 1))
+        self.assertEqual(["", "a\\b", ""], utils.esplit(":", ":a\\b:"))
+
+    def test_prefix_matcher(self):
+        for pattern in ("kernel-6.1", "kernel-6", r"kernel-\d", "6.1.14-1"):
+            match = utils._prefix_matcher(pattern)
+            for text in ("kernel-6.1.14", "kernel-6x1", "6.1.14-100", ""):
+                self.assertEqual(bool(re.match(pattern, text)),
+                                 bool(match(text)), (pattern, text))
+
+    def test_run_command(self):
+        self.assertEqual(0, utils.run_command(["true"]))
+        self.assertEqual(3, utils.run_command(["sh", "-c", "exit 3"]))
+        self.assertEqual(-9, utils.run_command(["sh", "-c", "kill -9 $$"]))
+        self.assertRaises(OSError, utils.run_command,
+                          ["/non/existing/command"])
+        # SIGPIPE has to be restored to default for the executed commands
+        self.assertEqual(0, utils.run_command(
+            ["sh", "-c", "yes | head -1 >/dev/null"]))
+        self.assertEqual(-signal.SIGPIPE,
+                         utils.run_command(["sh", "-c", "kill -PIPE $$"]))
+
     def test_range_beaker(self):
         # Check it won't fail (ignore bkr call/limit for now)
-        with open(os.path.join(os.path.dirname(__file__), 'assets',
-                  'bkr.json'), 'rb') as fd_bkr:
-            ret = unittest.mock.Mock()
-            ret.stdout = fd_bkr.read()
-            bkr = unittest.mock.Mock()
-            bkr.return_value = ret
+        ret = unittest.mock.Mock()
+        ret.stdout = self.bkr_json
+        bkr = unittest.mock.Mock()
+        bkr.return_value = ret
         distros = ['Distro-1.2.0-20230110', 'Distro-1.2.0-20230109',
                    'Distro-1.2.0-20230108', 'Distro-1.2.0-20230107',
                    'Distro-1.2.0-20230106', 'Distro-1.2.0-20230105',
                    'Distro-1.2.0-20230104']
-        with unittest.mock.patch('bisecter.subprocess.run', bkr):
+        with unittest.mock.patch('bisecter.utils.subprocess.run', bkr):
             self.assertEqual(distros,
                              utils.range_beaker("beaker://Distro-"))
             self.assertEqual(distros[:-2], utils.range_beaker(
@@ -56,17 +99,12 @@ class Utils(unittest.TestCase):
 
     def test_range_url(self):
         self.maxDiff = None
-        with open(os.path.join(os.path.dirname(__file__), 'assets',
-                  'koji-kernel.html'), 'rb') as fd_html:
-            req = unittest.mock.Mock()
-            req.read.return_value = fd_html.read()
-            urlopen = unittest.mock.MagicMock()
-            urlopen.return_value.__enter__.return_value = req
-        with open(os.path.join(os.path.dirname(__file__), 'assets',
-                  'koji-kernel-links.json'), 'r', encoding='utf-8') as fd_urls:
-            urls = json.load(fd_urls)
-        with unittest.mock.patch('bisecter.utils.urllib.request.urlopen',
-                                 urlopen):
+        req = unittest.mock.Mock()
+        req.read.return_value = self.koji_html
+        urlopen = unittest.mock.MagicMock()
+        urlopen.return_value.__enter__.return_value = req
+        urls = self.koji_links
+        with unittest.mock.patch('urllib.request.urlopen', urlopen):
             self.assertEqual(135, len(utils.range_url(
                 'url://https\\://koji.fedoraproject.org/koji//packageinfo?'
                 'packageID=8')))
@@ -92,6 +130,16 @@ class Utils(unittest.TestCase):
             self.assertEqual(urls[3:6], utils.range_url(
                 'url://https\\://koji.fedoraproject.org/koji//packageinfo?'
                 'packageID=8:kernel-\\d:kernel-6.1.14-100.*:+6'))
+            # Each call above fetched the page, with cache it's fetched once
+            calls = urlopen.call_count
+            cache = {}
+            self.assertEqual(urls, utils.range_url(
+                'url://https\\://koji.fedoraproject.org/koji//packageinfo?'
+                'packageID=8:kernel-\\d', cache=cache))
+            self.assertEqual(urls[4:], utils.range_url(
+                'url://https\\://koji.fedoraproject.org/koji//packageinfo?'
+                'packageID=8:kernel-\\d:+4', cache=cache))
+            self.assertEqual(calls + 1, urlopen.call_count)
 
 
 if __name__ == '__main__':
@@ -29,21 +29,26 @@ def _get_git_version():
 
     :warning: This implementation must match the "bisecter/version.py" one
     """
+    # Allow packagers/CI to provide the version without calling git
+    version = os.environ.get("BISECTER_VERSION")
+    if version:
+        return version
     curdir = os.getcwd()
     try:
         os.chdir(SETUP_PATH)
         git = shutil.which("git")
         version = subprocess.check_output(  # nosec
-            [git, "describe", "--tags",
-             "HEAD"]).strip().decode("utf-8")
+            [git, "describe", "--tags", "--dirty=+dirty"]).strip().decode(
+                "utf-8")
+        dirty = version.endswith("+dirty")
+        if dirty:
+            version = version[:-len("+dirty")]
         if version.count("-") == 2:
             split = version.split('-')
             version = "%s.%s+%s" % tuple(split)
         else:
             version = version.replace("-", ".")
-        try:
-            subprocess.check_output([git, "diff", "--quiet"])  # nosec
-        except subprocess.CalledProcessError:
+        if dirty:
             version += "+dirty"
     except (OSError, subprocess.SubprocessError, NameError):
         return '0.0'